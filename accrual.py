@@ -0,0 +1,145 @@
+#
+'''
+Vectorized SOFR accrual engine
+
+Replaces the per-pair rateSOFRon()/rateSOFRindex() calls with array
+operations over prefix products of dailyAccrual, so a whole row (or the
+whole upper triangle) of (d0, d1) accrual periods is priced at once.
+'''
+
+#
+import numpy as np
+import pandas as pd
+from sofrconst import DAY_COUNT, SOFR_INDEX, DAILY_ACCRUAL, RESULT_COLUMNS, FOLLOWING
+from buscal import BusCalendar, NOT_FOUND
+
+# prefixProducts(accruals)
+#   cumulative products of daily accrual factors, with a leading 1.0 so that
+#   the product over positions [p0, p1) is prefix[p1]/prefix[p0]
+#   missing factors (NaN) count as 1.0, same as pandas Series.product()
+def prefixProducts(accruals):
+  factors=np.where(np.isnan(accruals),1.0,accruals)
+  return np.concatenate(([1.0],np.cumprod(factors)))
+
+# ENGINE_ARRAYS : numeric state of an AccrualEngine (see engineArrays()),
+#   enough to price any pair without the dataframes
+ENGINE_ARRAYS=['prefix','index','ordinal','pos','endpos']
+
+# trianglePairs(n, row0, row1)
+#   positions (i, j>i) of n testdates for rows [row0, row1), row-major order
+def trianglePairs(n, row0=0, row1=None):
+  if row1 is None:
+    row1=n
+  rows=np.arange(row0,max(row1,row0),dtype=np.int64)
+  counts=np.maximum(n-1-rows,0)
+  i=np.repeat(rows,counts)
+  rowstart=np.repeat(np.cumsum(counts)-counts,counts)
+  j=i+1+(np.arange(len(i),dtype=np.int64)-rowstart)
+  return i,j
+
+# columnPairs(n, col0, col1)
+#   positions (i<j, j) of n testdates for columns [col0, col1), i.e. every
+#   pair ending on testdates[col0:col1], column-major order
+def columnPairs(n, col0, col1=None):
+  if col1 is None:
+    col1=n
+  cols=np.arange(max(col0,1),max(col1,col0),dtype=np.int64)
+  j=np.repeat(cols,cols)
+  colstart=np.repeat(np.cumsum(cols)-cols,cols)
+  i=np.arange(len(j),dtype=np.int64)-colstart
+  return i,j
+
+# pairRates(arrays, i, j, day_count)
+#   arrays : dict of ENGINE_ARRAYS
+#   i, j   : arrays of positions in testdates, i<j elementwise
+#   returns (daysaccr, compounded, indexed) arrays
+#   accrual stops 1 bus. day before d1, i.e. alldf positions [p0, p1end)
+def pairRates(arrays, i, j, day_count=DAY_COUNT):
+  prefix=arrays['prefix']
+  index=arrays['index']
+  ordinal=arrays['ordinal']
+  p0=arrays['pos'][i]
+  p1=arrays['pos'][j]
+  p1end=arrays['endpos'][j]
+  daysaccr=ordinal[p1]-ordinal[p0]
+  compounded=(prefix[p1end]/prefix[p0]-1)*day_count/daysaccr
+  indexed=(index[p1]/index[p0]-1)*day_count/daysaccr
+  return daysaccr,compounded,indexed
+
+# AccrualEngine(alldf, testdates)
+#   alldf     : merged SOFR dataframe with dailyAccrual and index columns
+#   testdates : dates (subset of alldf.index) used as d0/d1 of accrual periods
+#   precomputes, once, the arrays needed to price any pair of testdates:
+#     prefix  : prefixProducts(alldf.dailyAccrual)
+#     index   : SOFR index aligned to alldf.index
+#     ordinal : calendar day number of every alldf date
+#     pos     : position of every testdate within alldf
+#     endpos  : accrualEnd() of every testdate
+#   calendar  : BusCalendar of alldf.index, built here unless given
+class AccrualEngine:
+  def __init__(self, alldf, testdates, day_count=DAY_COUNT, calendar=None):
+    self.day_count=day_count
+    self.calendar=BusCalendar(alldf.index) if calendar is None else calendar
+    self.dates=self.calendar.dates
+    self.testdates=pd.DatetimeIndex(testdates)
+    self.prefix=prefixProducts(alldf[DAILY_ACCRUAL].to_numpy(dtype=np.float64))
+    self.index=alldf[SOFR_INDEX].to_numpy(dtype=np.float64)
+    self.ordinal=self.calendar.days
+    self.pos=self.calendar.locate(self.testdates)
+    if (self.pos==NOT_FOUND).any():
+      raise KeyError('testdates not found in alldf: '+\
+                     ', '.join(str(d.date()) for d in self.testdates[self.pos==NOT_FOUND]))
+    self.endpos=self.accrualEnd(self.testdates)
+
+  # accrualEnd(coupon_dates)
+  #   alldf position one past d1prevBD for every coupon date, i.e. the
+  #   accrual of a period ending on d1 covers positions [p0, accrualEnd(d1))
+  #   (accrual stops 1 bus. day before the coupon date)
+  def accrualEnd(self, coupon_dates):
+    prevBD=self.calendar.shiftPos(coupon_dates,FOLLOWING,-1)
+    return np.where(prevBD==NOT_FOUND,NOT_FOUND,prevBD+1)
+
+  def __len__(self):
+    return len(self.testdates)
+
+  # number of (i, j>i) pairs in the upper triangle
+  def pairCount(self):
+    n=len(self.testdates)
+    return n*(n-1)//2
+
+  # engineArrays() : dict of ENGINE_ARRAYS, e.g. to share with workers
+  def engineArrays(self):
+    return {name:getattr(self,name) for name in ENGINE_ARRAYS}
+
+  # rates(i, j) : see pairRates()
+  def rates(self, i, j):
+    return pairRates(self.engineArrays(),i,j,self.day_count)
+
+  # rowPairs(i) : positions (i, j) for all j>i
+  def rowPairs(self, i):
+    j=np.arange(i+1,len(self.testdates))
+    return np.full(len(j),i),j
+
+  # trianglePairs(row0, row1) : see trianglePairs()
+  def trianglePairs(self, row0=0, row1=None):
+    return trianglePairs(len(self.testdates),row0,row1)
+
+  # columnPairs(col0, col1) : see columnPairs()
+  def columnPairs(self, col0, col1=None):
+    return columnPairs(len(self.testdates),col0,col1)
+
+  # frame(i, j, rates) : results dataframe (same layout as the reference loop)
+  #   rates : (daysaccr, compounded, indexed) if already computed
+  def frame(self, i, j, rates=None):
+    daysaccr,compounded,indexed=self.rates(i,j) if rates is None else rates
+    return pd.DataFrame({'d0':self.testdates[i],
+                         'd1':self.testdates[j],
+                         'daysaccr':daysaccr,
+                         'compounded':compounded,
+                         'indexed':indexed},columns=RESULT_COLUMNS)
+
+  def row(self, i):
+    return self.frame(*self.rowPairs(i))
+
+  def triangle(self):
+    return self.frame(*self.trianglePairs())
@@ -0,0 +1,215 @@
+#
+'''
+Offline benchmark of the pipeline stages on synthetic SOFR data
+
+Builds realistic percentRate/index series of any length (weekends and
+holidays skipped, index compounded from the rates and rounded like the
+Fed's), then runs each stage on its own for several test period lengths N:
+
+  fetch   : chunked concurrent fedQueries() against a local HTTP stand-in
+  merge   : combineSeries() and BusCalendar
+  accrual : AccrualEngine over the N(N-1)/2 pairs, in blocks
+  write   : ResultsWriter of those blocks
+  summary : ErrorStats of those blocks and its summary
+
+Wall time (untraced), peak traced memory (separate pass) and items (pairs, or fetched/merged rows) per
+second go to a JSON file; --baseline compares against a saved one.
+
+usage: python bench.py --sizes 250 500 1000 --out bench.json [--baseline old.json]
+'''
+
+#
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import threading
+import urllib.parse
+import http.server
+from datetime import datetime as dt
+import numpy as np
+import pandas as pd
+import feddata
+import resultstore
+from sofrconst import SOFR_ON_REQCODE, SOFR_ON, SOFR_INDEX_REQCODE, SOFR_INDEX
+from buscal import BusCalendar
+from accrual import AccrualEngine
+from parallel import shardResults
+from errstats import ErrorStats
+from stagetimer import StageTimer
+
+SIZES=[250,500,1000]
+REPEATS=3
+TOLERANCE=0.10 # slowdown vs baseline reported as a regression
+SYNTHETIC_START='2018-04-02'
+HOLIDAYS_PER_YEAR=10
+INDEX_LAG=480 # bus. days of SOFR ON before the first SOFR Index value
+
+# syntheticSeries(n, seed, start)
+#   (sofrdf, indexdf) in fedQuery() layout, n bus. days of SOFR ON and the
+#   SOFR Index starting INDEX_LAG bus. days later (at least n//2 days of it)
+#   bus. days skip weekends and HOLIDAYS_PER_YEAR random holidays a year,
+#   rates are a mean-reverting random walk in % rounded to 2 decimals
+def syntheticSeries(n, seed=0, start=SYNTHETIC_START):
+  rng=np.random.default_rng(seed)
+  lag=min(INDEX_LAG,n//2)
+  days=pd.bdate_range(start,periods=int(n*1.1)+30)
+  holidays=rng.random(len(days))<HOLIDAYS_PER_YEAR/260
+  dates=days[~holidays][:n]
+  rates=np.empty(n)
+  level=1.5
+  for k in range(n):
+    level=max(level+0.05*(1.5-level)+rng.normal(0,0.03),0.01)
+    rates[k]=level
+  rates=np.round(rates,2)
+  dates64=dates.values.astype('datetime64[D]')
+  accrual=1+rates[:-1]*np.diff(dates64).astype(np.int64)/36000
+  index=np.round(np.concatenate(([1.0],np.cumprod(accrual[lag:]))),8)
+  sofrdf=feddata.seriesFrame(SOFR_ON,dates64,rates)
+  indexdf=feddata.seriesFrame(SOFR_INDEX,dates64[lag:],index)
+  return sofrdf,indexdf
+
+# fedXml(df, rateName) : Fed style XML response for the rows of df
+def fedXml(df, rateName):
+  rows=''.join('<refRate><effectiveDate>{}</effectiveDate><type>SOFR</type>'
+               '<{}>{!r}</{}></refRate>'.format(d.date(),rateName,float(v),rateName)
+               for (d,v) in df[rateName].items())
+  return ('<?xml version="1.0" encoding="UTF-8"?><refRates>'+rows+'</refRates>').encode()
+
+# serveSeries(series) : local HTTP stand-in for FEDMKT_URL
+#   series : {eventCode: dataframe, or a recorded XML response (bytes)
+#            served as is whatever the requested dates}
+#   returns (server, url)
+#   responses are cached per URL, so repeats time the client side only
+def serveSeries(series):
+  responses={}
+  class FedHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+      pass
+    def do_GET(self):
+      if self.path not in responses:
+        query=urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        df=series[query['eventCodes'][0]]
+        if isinstance(df,bytes):
+          responses[self.path]=df
+        else:
+          rows=df.loc[query['startDt'][0]:query['endDt'][0]]
+          responses[self.path]=fedXml(rows,df.columns[0])
+      body=responses[self.path]
+      self.send_response(200)
+      self.send_header('Content-Type','application/xml')
+      self.send_header('Content-Length',str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+  server=http.server.ThreadingHTTPServer(('127.0.0.1',0),FedHandler)
+  threading.Thread(target=server.serve_forever,daemon=True).start()
+  return server,'http://127.0.0.1:{}/read'.format(server.server_address[1])
+
+# benchSize(n, repeats, workers)
+#   runs every stage repeats times for a test period of n bus. days with
+#   memory tracing off, then once more with tracemalloc for peak memory
+#   (tracing slows python level work, so it must not be in the timings)
+#   returns list of result dicts (best wall time of the repeats)
+def benchSize(n, repeats=REPEATS, workers=1):
+  if repeats<1:
+    raise ValueError('repeats must be at least 1, got '+str(repeats))
+  sofrdf,indexdf=syntheticSeries(n+INDEX_LAG)
+  server,url=serveSeries({SOFR_ON_REQCODE:sofrdf,SOFR_INDEX_REQCODE:indexdf})
+  queries=[(SOFR_ON_REQCODE,SOFR_ON,sofrdf.index[0].date(),sofrdf.index[-1].date()),
+           (SOFR_INDEX_REQCODE,SOFR_INDEX,indexdf.index[0].date(),indexdf.index[-1].date())]
+  alldf=feddata.combineSeries(sofrdf,indexdf)
+  testdates=indexdf.index[-n:]
+  engine=AccrualEngine(alldf,testdates)
+  blocks=list(shardResults(engine,workers,block_pairs=resultstore.BLOCK_PAIRS))
+  pairs=engine.pairCount()
+  best={}
+  try:
+    for repeat in range(repeats+1):
+      memory=(repeat==repeats) # last pass measures peak memory only
+      timer=StageTimer(memory=memory)
+      with timer.stage('fetch',len(sofrdf)+len(indexdf)):
+        feddata.fedQueries(queries,url)
+      with timer.stage('merge',len(sofrdf)+len(indexdf)):
+        BusCalendar(feddata.combineSeries(sofrdf,indexdf).index)
+      with timer.stage('accrual',pairs):
+        for block in shardResults(engine,workers,block_pairs=resultstore.BLOCK_PAIRS):
+          pass
+      with tempfile.TemporaryDirectory() as tmp:
+        with timer.stage('write',pairs):
+          with resultstore.ResultsWriter(os.path.join(tmp,'results.bin')) as writer:
+            for (i,j,rates) in blocks:
+              writer.write(resultstore.resultRecords(testdates,i,j,rates))
+      with timer.stage('summary',pairs):
+        stats=ErrorStats()
+        for (i,j,rates) in blocks:
+          stats.add(*rates)
+        stats.summary()
+      for result in timer.results():
+        if memory:
+          best[result['stage']]['peak_bytes']=result['peak_bytes']
+        elif result['stage'] not in best or result['wall_s']<best[result['stage']]['wall_s']:
+          best[result['stage']]=result
+  finally:
+    server.shutdown()
+    server.server_close()
+  return [dict(result,n=n,workers=workers) for result in best.values()]
+
+# compareBaseline(results, baseline, tolerance)
+#   prints new vs baseline wall time of every (stage, n) in both,
+#   returns the list of regressions (slower by more than tolerance)
+def compareBaseline(results, baseline, tolerance=TOLERANCE):
+  old={(r['stage'],r['n']):r for r in baseline['results']}
+  regressions=[]
+  print('{:<10} {:>8} {:>12} {:>12} {:>8}'.format('stage','n','base_s','new_s','ratio'))
+  for r in results:
+    key=(r['stage'],r['n'])
+    if key not in old:
+      continue
+    ratio=r['wall_s']/old[key]['wall_s'] if old[key]['wall_s']>0 else float('inf')
+    flag=' REGRESSION' if ratio>1+tolerance else ''
+    print('{:<10} {:>8} {:>12.4f} {:>12.4f} {:>8.2f}{}'.format(\
+      r['stage'],r['n'],old[key]['wall_s'],r['wall_s'],ratio,flag))
+    if flag:
+      regressions.append(key)
+  return regressions
+
+# positiveInt(value) : argparse type of counts that must be at least 1
+def positiveInt(value):
+  count=int(value)
+  if count<1:
+    raise argparse.ArgumentTypeError('must be at least 1, got '+value)
+  return count
+
+if __name__=='__main__':
+  parser=argparse.ArgumentParser(description='benchmark pipeline stages on synthetic SOFR data')
+  parser.add_argument('--sizes',type=int,nargs='+',default=SIZES,help='test period lengths N (bus. days)')
+  parser.add_argument('--repeats',type=positiveInt,default=REPEATS)
+  parser.add_argument('--workers',type=positiveInt,default=1)
+  parser.add_argument('--out',default='bench.json')
+  parser.add_argument('--baseline',help='saved bench.json to compare against')
+  parser.add_argument('--tolerance',type=float,default=TOLERANCE)
+  args=parser.parse_args()
+
+  results=[]
+  for n in args.sizes:
+    print('N=',n,' (',n*(n-1)//2,' pairs)')
+    results.extend(benchSize(n,args.repeats,args.workers))
+  for r in results:
+    print('{:<10} {:>8} {:>10.4f}s {:>10.1f}MB {:>14.0f}/s'.format(\
+      r['stage'],r['n'],r['wall_s'],r['peak_bytes']/1e6,r['items_per_s'] or 0))
+  with open(args.out,'w') as f:
+    json.dump({'meta':{'date':dt.now().isoformat(timespec='seconds'),
+                       'python':platform.python_version(),
+                       'numpy':np.__version__,
+                       'pandas':pd.__version__,
+                       'machine':platform.machine(),
+                       'cpus':os.cpu_count()},
+               'results':results},f,indent=1)
+  print('Results written to ',args.out)
+  if args.baseline:
+    with open(args.baseline) as f:
+      regressions=compareBaseline(results,json.load(f),args.tolerance)
+    if regressions:
+      sys.exit(1)
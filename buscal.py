@@ -0,0 +1,106 @@
+#
+'''
+Business-day calendar built once from the dates of alldf
+
+Replaces the per-call pd.Index/get_indexer work in dateShift() with dense
+lookup tables over the calendar span, so exact/following/preceding matches
+and bus. day shifts are O(1) per date and vectorized over arrays of dates.
+'''
+
+#
+import numpy as np
+import pandas as pd
+from sofrconst import FOLLOWING, PRECEDING
+
+NOT_FOUND=-1
+NAT_DAY=np.iinfo(np.int64).min # dayNumbers() of NaT
+
+# dayNumbers(dates)
+#   days since 1970-01-01 as int64 array, for a date, Timestamp,
+#   datetime64 or any array-like of them (NaT gives NAT_DAY)
+def dayNumbers(dates):
+  values=pd.to_datetime(np.atleast_1d(np.asarray(dates)))
+  return np.asarray(values.values.astype('datetime64[D]').astype(np.int64))
+
+# BusCalendar(dates)
+#   dates : business days, e.g. alldf.index
+#   lookup tables hold, for every calendar day between the first and last
+#   bus. day, the position of the exact/following/preceding bus. day
+class BusCalendar:
+  def __init__(self, dates):
+    self.dates=pd.DatetimeIndex(dates).unique().sort_values()
+    self.days=dayNumbers(self.dates)
+    n=len(self.days)
+    if n==0:
+      raise ValueError('empty business day calendar')
+    self.first=self.days[0]
+    span=self.days[-1]-self.first+1
+    offsets=self.days-self.first
+    self.exact=np.full(span,NOT_FOUND,dtype=np.int64)
+    self.exact[offsets]=np.arange(n)
+    # following: first bus. day on or after, preceding: last on or before
+    counts=np.zeros(span,dtype=np.int64)
+    counts[offsets]=1
+    self.preceding=np.cumsum(counts)-1
+    self.following=self.preceding+1-counts
+
+  def __len__(self):
+    return len(self.days)
+
+  # locate(base_dates, match)
+  #   positions of base_dates in the calendar, NOT_FOUND where unresolved
+  #   (including NaT)
+  #   match : +1 following, 0 exact, -1 preceding (same as dateShift())
+  def locate(self, base_dates, match=0):
+    days=dayNumbers(base_dates)
+    # NaT is int64 min, keep it out of the offset arithmetic
+    missing=days==NAT_DAY
+    offsets=np.where(missing,0,days)-self.first
+    return np.where(missing,NOT_FOUND,self.locateOffsets(offsets,match))
+
+  # locateOffsets(offsets, match) : locate() of days since the first bus. day
+  def locateOffsets(self, offsets, match=0):
+    span=len(self.exact)
+    inside=(offsets>=0)&(offsets<span)
+    clipped=np.clip(offsets,0,span-1)
+    if match>0:
+      pos=self.following[clipped]
+      pos=np.where(offsets<0,0,pos)
+      return np.where(offsets>=span,NOT_FOUND,pos)
+    elif match<0:
+      pos=self.preceding[clipped]
+      pos=np.where(offsets>=span,len(self.days)-1,pos)
+      return np.where(offsets<0,NOT_FOUND,pos)
+    return np.where(inside,self.exact[clipped],NOT_FOUND)
+
+  # shiftPos(base_dates, match, shift)
+  #   locate() then move shift bus. days, shift>0 later, shift<0 earlier
+  #   NOT_FOUND where unresolved or shifted off either end of the calendar
+  def shiftPos(self, base_dates, match=0, shift=0):
+    pos=self.locate(base_dates,match)
+    shifted=pos+shift
+    valid=(pos!=NOT_FOUND)&(shifted>=0)&(shifted<len(self.days))
+    return np.where(valid,shifted,NOT_FOUND)
+
+  # shift(base_dates, match, shift)
+  #   vectorized dateShift(), DatetimeIndex with NaT where unresolved
+  def shift(self, base_dates, match=0, shift=0):
+    pos=self.shiftPos(base_dates,match,shift)
+    values=self.dates.values[np.maximum(pos,0)]
+    values[pos==NOT_FOUND]=np.datetime64('NaT')
+    return pd.DatetimeIndex(values)
+
+  # dateShift(base_date, match, shift)
+  #   single date version of shift(), None where unresolved
+  def dateShift(self, base_date, match=0, shift=0):
+    pos=self.shiftPos(base_date,match,shift)[0]
+    if pos==NOT_FOUND:
+      return None
+    return self.dates[pos]
+
+  # position(base_date) : exact position of a bus. day, KeyError if not one
+  def position(self, base_date):
+    pos=self.locate(base_date)[0]
+    if pos==NOT_FOUND:
+      raise KeyError(base_date)
+    return pos
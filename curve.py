@@ -0,0 +1,104 @@
+#
+'''
+Batch SOFR accrual queries on the data in alldf
+
+SOFRCurve prices arrays of interest periods in one vectorized call, with
+the usual compounded-in-arrears conventions: lookback, lockout, observation
+shift and day-count basis. Products over the period come from prefix
+products of the daily factors, cached per lookback/basis, so each period
+costs O(1) (O(lockout) for the locked-out days).
+
+  curve=SOFRCurve(alldf)
+  compounded,indexed=curve.accrue(starts,ends,lookback=5,observation_shift=True)
+'''
+
+#
+import numpy as np
+from sofrconst import DAY_COUNT, SOFR_ON, SOFR_INDEX, FOLLOWING
+from buscal import BusCalendar, NOT_FOUND
+from accrual import prefixProducts
+
+# SOFRCurve(alldf, calendar)
+#   alldf    : merged SOFR dataframe (percentRate, index columns)
+#   calendar : BusCalendar of alldf.index, built here unless given
+class SOFRCurve:
+  def __init__(self, alldf, calendar=None):
+    self.calendar=BusCalendar(alldf.index) if calendar is None else calendar
+    self.ordinal=self.calendar.days
+    self.rates=alldf[SOFR_ON].to_numpy(dtype=np.float64)/100
+    self.index=alldf[SOFR_INDEX].to_numpy(dtype=np.float64)
+    # days each rate applies for, up to the next bus. day
+    self.days=np.append(np.diff(self.ordinal).astype(np.float64),np.nan)
+    self._prefix={}
+
+  # lagged(values, lag) : values[i-lag] at position i, NaN before the start
+  def lagged(self, values, lag):
+    if lag==0:
+      return values
+    shifted=np.full(len(values),np.nan)
+    shifted[lag:]=values[:len(values)-lag]
+    return shifted
+
+  # prefix(lag, day_count)
+  #   prefix products of 1+rate[i-lag]*days[i]/day_count, see prefixProducts()
+  def prefix(self, lag, day_count=DAY_COUNT):
+    key=(lag,day_count)
+    if key not in self._prefix:
+      self._prefix[key]=prefixProducts(1+self.lagged(self.rates,lag)*self.days/day_count)
+    return self._prefix[key]
+
+  # accrue(starts, ends, lookback, lockout, observation_shift, day_count)
+  #   starts, ends      : interest period dates (array-like), rolled to the
+  #                       following bus. day
+  #   lookback          : rates are observed lookback bus. days earlier
+  #   lockout           : the last lockout bus. days of the period use the
+  #                       rate of the first of them (0 or 1: no lockout)
+  #   observation_shift : False, each day is weighted by the interest period
+  #                       days it covers; True, the whole observation period
+  #                       (shifted back by lookback) is used for rates, day
+  #                       weights and the annualizing day count
+  #   day_count         : day-count basis, 360 (ACT/360) or 365 (ACT/365)
+  #   lookback, lockout and observation_shift may be scalars or arrays
+  #   returns (compounded, indexed) annualized rates, NaN where a period
+  #   cannot be priced (dates outside the data, end<=start, no lookback data)
+  #   indexed uses the SOFR index at the shifted start/end dates, exact for
+  #   observation_shift or lookback=0 without lockout (lockout is ignored)
+  def accrue(self, starts, ends, lookback=0, lockout=0, observation_shift=False, day_count=DAY_COUNT):
+    ps=self.calendar.locate(starts,FOLLOWING)
+    pe=self.calendar.locate(ends,FOLLOWING)
+    count=len(ps)
+    lookback=np.broadcast_to(np.asarray(lookback,dtype=np.int64),(count,))
+    lockout=np.broadcast_to(np.asarray(lockout,dtype=np.int64),(count,))
+    shift=np.broadcast_to(np.asarray(observation_shift,dtype=bool),(count,))
+    valid=(ps!=NOT_FOUND)&(pe!=NOT_FOUND)&(pe>ps)&(ps-lookback>=0)
+    # window [a, b) of positions whose day weights are used, rate for
+    # position i is taken from position i-lag
+    a=np.where(shift,ps-lookback,ps)
+    b=np.where(shift,pe-lookback,pe)
+    lag=np.where(shift,0,lookback)
+    a=np.where(valid,a,0)
+    b=np.where(valid,b,0)
+    # lockout: positions [c, b) use the rate of position c-1
+    c=np.where(lockout>1,np.maximum(b-lockout,a)+1,b)
+    growth=np.empty(count)
+    for value in np.unique(lag):
+      sel=lag==value
+      prefix=self.prefix(int(value),day_count)
+      growth[sel]=prefix[c[sel]]/prefix[a[sel]]
+    if (lockout>1).any():
+      locked_rate=self.rates[np.maximum(c-1-lag,0)]
+      for m in range(int(lockout.max())-1):
+        pos=c+m
+        inside=pos<b
+        days=self.days[np.where(inside,pos,0)]
+        growth=np.where(inside,growth*(1+locked_rate*days/day_count),growth)
+    accrual_days=self.ordinal[b]-self.ordinal[a]
+    ia=np.where(valid,ps-lookback,0)
+    ib=np.where(valid,pe-lookback,0)
+    # invalid rows have accrual_days==0, they are masked to NaN below
+    with np.errstate(divide='ignore',invalid='ignore'):
+      compounded=(growth-1)*day_count/accrual_days
+      indexed=(self.index[ib]/self.index[ia]-1)*day_count/accrual_days
+    compounded=np.where(valid,compounded,np.nan)
+    indexed=np.where(valid,indexed,np.nan)
+    return compounded,indexed
@@ -0,0 +1,96 @@
+#
+'''
+Single-pass error statistics for the accrual comparison
+
+ErrorStats counts, per number of accrued days, the samples and the pairs
+whose compounded and indexed rates differ after rounding to each precision.
+Blocks of pairs are added as they are produced and partial counts (e.g. from
+separate shards) merge exactly; term buckets are only applied by summary().
+'''
+
+#
+import numpy as np
+import pandas as pd
+
+PRECISIONS=[ 3, 4, 5, 6 ] # decimal places, 5 = 0.01234 -> 1.234%
+CRITICAL_TERMS=[1,3,6] # months
+MAXTERM=9999
+BUSDAYS_PER_YEAR=253
+SUMMARY_COLUMNS=["prec","minterm","maxterm","errors","samples"]
+
+# termBuckets(critical_terms, maxterm)
+#   (min_terms, max_terms) of the summary buckets: everything, up to the
+#   first critical term, between consecutive critical terms, beyond the
+#   last one, and exactly at each critical term
+def termBuckets(critical_terms=CRITICAL_TERMS, maxterm=MAXTERM, busdays_per_year=BUSDAYS_PER_YEAR):
+  terms=np.asarray(critical_terms)*busdays_per_year/12
+  min_terms=np.round(np.append(0,np.append(np.append(0,terms),terms)),0)
+  max_terms=np.round(np.append(maxterm,np.append(np.append(terms,maxterm),terms)),0)
+  return min_terms,max_terms
+
+# grow(counts, length) : counts zero padded along the last axis to length
+def grow(counts, length):
+  if counts.shape[-1]>=length:
+    return counts
+  padding=[(0,0)]*(counts.ndim-1)+[(0,length-counts.shape[-1])]
+  return np.pad(counts,padding)
+
+# ErrorStats(precisions)
+#   samples : samples[d] = pairs with d accrued days
+#   errors  : errors[k, d] = pairs with d accrued days whose rates differ
+#             after rounding to precisions[k]
+class ErrorStats:
+  def __init__(self, precisions=PRECISIONS):
+    self.precisions=list(precisions)
+    self.samples=np.zeros(0,dtype=np.int64)
+    self.errors=np.zeros((len(self.precisions),0),dtype=np.int64)
+
+  def __len__(self):
+    return int(self.samples.sum())
+
+  # add(daysaccr, compounded, indexed) : count a block of pairs
+  def add(self, daysaccr, compounded, indexed):
+    days=np.asarray(daysaccr,dtype=np.int64)
+    if len(days)==0:
+      return self
+    length=max(len(self.samples),int(days.max())+1)
+    self.samples=grow(self.samples,length)
+    self.errors=grow(self.errors,length)
+    self.samples+=np.bincount(days,minlength=length)
+    compounded=np.asarray(compounded)
+    indexed=np.asarray(indexed)
+    for (k,precision) in enumerate(self.precisions):
+      differ=np.round(compounded,precision)!=np.round(indexed,precision)
+      self.errors[k]+=np.bincount(days[differ],minlength=length)
+    return self
+
+  # merge(other) : add the counts of another ErrorStats
+  def merge(self, other):
+    if other.precisions!=self.precisions:
+      raise ValueError('cannot merge ErrorStats with different precisions')
+    length=max(len(self.samples),len(other.samples))
+    self.samples=grow(self.samples,length)+grow(other.samples,length)
+    self.errors=grow(self.errors,length)+grow(other.errors,length)
+    return self
+
+  # bucketMask(min_term, max_term) : accrued days in the bucket
+  #   min_term < days < max_term, or days == max_term
+  def bucketMask(self, min_term, max_term):
+    days=np.arange(len(self.samples))
+    return ((days>min_term)&(days<max_term))|(days==max_term)
+
+  # summary(min_terms, max_terms)
+  #   dataframe of SUMMARY_COLUMNS, one row per precision and term bucket
+  #   holding any samples
+  def summary(self, min_terms=None, max_terms=None):
+    if min_terms is None:
+      min_terms,max_terms=termBuckets()
+    summary = []
+    for (k,precision) in enumerate(self.precisions):
+      for (min_term,max_term) in zip(min_terms,max_terms):
+        mask=self.bucketMask(min_term,max_term)
+        samples=self.samples[mask].sum()
+        if(samples>0):
+          errors=self.errors[k][mask].sum()
+          summary.append([precision, int(min_term), int(max_term), int(errors), int(samples)])
+    return pd.DataFrame(summary,columns=SUMMARY_COLUMNS)
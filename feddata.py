@@ -0,0 +1,229 @@
+#
+'''
+SOFR data acquisition from the Fed XML web service
+
+Keeps a local on-disk store of the SOFR ON (percentRate) and SOFR Index
+(index) series, so a run only downloads dates after the last stored
+effectiveDate (plus a short overlap to pick up revisions), or nothing at
+all in offline mode.
+'''
+
+#
+import os
+import urllib.request
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt, timedelta, date
+import math
+import numpy as np
+import pandas as pd
+try:
+  from lxml import etree
+except ImportError: # stdlib parser, also incremental
+  import xml.etree.ElementTree as etree
+from sofrconst import FEDMKT_URL, SOFR_ON, DAY_COUNT, DAILY_ACCRUAL
+
+STORE_FILE='sofrstore.npz'
+STALE_BUSDAYS=3 # bus. days without a new fixing before the store is stale
+CHUNK_DAYS=366 # calendar days per Fed request
+REVISION_DAYS=7 # calendar days re-requested before the last stored fixing
+FETCH_WORKERS=4 # concurrent Fed requests
+EPOCH_ORDINAL=date(1970,1,1).toordinal()
+
+def date2ccyymmdd(dateObj):
+  return dt.strftime(dateObj,'%Y-%m-%d')
+
+def fedQueryUrl(rateCode, startDate, endDate, url=FEDMKT_URL):
+  return url+'?'+\
+  '&startDt='+date2ccyymmdd(startDate)+\
+  '&endDt='+date2ccyymmdd(endDate)+\
+  '&productCode=50'+\
+  '&eventCodes='+rateCode+'&sort=postDt:1&format=xml'
+
+# dateChunks(startDate, endDate, chunk_days)
+#   splits [startDate, endDate] into consecutive ranges of at most chunk_days
+def dateChunks(startDate, endDate, chunk_days=CHUNK_DAYS):
+  chunks = []
+  chunkStart = startDate
+  while chunkStart<=endDate:
+    chunkEnd = min(chunkStart+timedelta(days=chunk_days-1),endDate)
+    chunks.append((chunkStart,chunkEnd))
+    chunkStart = chunkEnd+timedelta(days=1)
+  return chunks
+
+# parseFedXml(stream, rateName)
+#   incremental parse of a Fed XML response as it is read from stream,
+#   effectiveDate and rateName elements are paired in document order
+#   returns (dates as datetime64[D] array, rates as float64 array)
+def parseFedXml(stream, rateName):
+  ordinals = array('q')
+  rates = array('d')
+  for event,elem in etree.iterparse(stream,events=('end',)):
+    tag = elem.tag
+    if not isinstance(tag,str):
+      continue # comments, processing instructions
+    tag = tag.rsplit('}',1)[-1] # drop namespace
+    if tag=='effectiveDate':
+      ordinals.append(date.fromisoformat(elem.text.strip()).toordinal()-EPOCH_ORDINAL)
+    elif tag==rateName:
+      rates.append(float(elem.text))
+    elem.clear()
+  if len(ordinals)!=len(rates):
+    raise ValueError('Fed XML has '+str(len(ordinals))+' effectiveDate and '+\
+                     str(len(rates))+' '+rateName+' elements')
+  dates = np.frombuffer(ordinals,dtype=np.int64).astype('datetime64[D]')
+  return dates,np.frombuffer(rates,dtype=np.float64)
+
+def fedQueryChunk(rateCode, rateName, startDate, endDate, url=FEDMKT_URL):
+  with urllib.request.urlopen(fedQueryUrl(rateCode,startDate,endDate,url)) as response:
+    return parseFedXml(response,rateName)
+
+# fedQueries(queries, url, chunk_days, max_workers)
+#   queries : list of (rateCode, rateName, startDate, endDate)
+#   every query is split into chunk_days ranges and all chunks of all
+#   queries are fetched concurrently on a pool of max_workers threads
+#   returns list of dataframes (see seriesFrame()), in the order of queries
+def fedQueries(queries, url=FEDMKT_URL, chunk_days=CHUNK_DAYS, max_workers=FETCH_WORKERS):
+  tasks = []
+  for (rateCode,rateName,startDate,endDate) in queries:
+    tasks.append([(rateCode,rateName,s,e,url) for (s,e) in dateChunks(startDate,endDate,chunk_days)])
+  with ThreadPoolExecutor(max_workers=max_workers) as pool:
+    futures = [[pool.submit(fedQueryChunk,*task) for task in query_tasks] for query_tasks in tasks]
+    results = []
+    for ((rateCode,rateName,startDate,endDate),query_futures) in zip(queries,futures):
+      parts = [future.result() for future in query_futures]
+      dates = np.concatenate([p[0] for p in parts]) if parts else np.array([],dtype='datetime64[D]')
+      rates = np.concatenate([p[1] for p in parts]) if parts else np.array([],dtype=np.float64)
+      results.append(seriesFrame(rateName,dates,rates))
+  return results
+
+def fedQuery(rateCode, rateName,startDate,endDate, url=FEDMKT_URL):
+  return fedQueries([(rateCode,rateName,startDate,endDate)],url)[0]
+  # end fedQuery()
+
+# seriesFrame(rateName, dates, values)
+#   single column dataframe indexed by date, same layout as fedQuery()
+def seriesFrame(rateName, dates, values):
+  df = pd.DataFrame({rateName:np.asarray(values,dtype=np.float64)},
+                    index=pd.DatetimeIndex(np.asarray(dates,dtype='datetime64[ns]'),name='date'))
+  return df
+
+# loadStore(path)
+#   returns {rateName: dataframe} for every series in the store file,
+#   empty dict if the file does not exist
+#   file layout (numpy .npz): '<rateName>' float64 values and
+#   '<rateName>.date' datetime64[D] effective dates
+def loadStore(path):
+  if not os.path.exists(path):
+    return {}
+  store = {}
+  with np.load(path) as npz:
+    for key in npz.files:
+      if key.endswith('.date'):
+        continue
+      store[key] = seriesFrame(key,npz[key+'.date'],npz[key])
+  return store
+
+# saveStore(path, store)
+#   writes {rateName: dataframe} to path, replacing the file atomically
+def saveStore(path, store):
+  arrays = {}
+  for rateName,df in store.items():
+    arrays[rateName] = df[rateName].to_numpy(dtype=np.float64)
+    arrays[rateName+'.date'] = df.index.values.astype('datetime64[D]')
+  tmp_path = path+'.tmp'
+  with open(tmp_path,'wb') as f:
+    np.savez(f,**arrays)
+  os.replace(tmp_path,path)
+
+# lastDate(df) : last stored effectiveDate, None if empty
+def lastDate(df):
+  if df is None or len(df)==0:
+    return None
+  return df.index[-1].date()
+
+# isStale(df, asof, max_busdays)
+#   True if more than max_busdays bus. days (Mon-Fri) have passed between
+#   the last stored effectiveDate and asof
+def isStale(df, asof, max_busdays=STALE_BUSDAYS):
+  last = lastDate(df)
+  if last is None:
+    return True
+  return np.busday_count(last,asof)>max_busdays
+
+# refreshRange(df, rateName, startDate, endDate, offline, overlap_days)
+#   df        : stored series (None if not stored yet)
+#   returns the (start, end) dates still to be queried for df, i.e. dates
+#   after its last effectiveDate, plus the last overlap_days calendar days
+#   again so Fed revisions of recent fixings replace the stored values
+#   (the full startDate..endDate range if nothing is stored), None if there
+#   is nothing to query
+#   offline   : never query, df must already be stored
+def refreshRange(df, rateName, startDate, endDate, offline=False, overlap_days=REVISION_DAYS):
+  if offline:
+    if df is None:
+      raise FileNotFoundError('offline mode: '+rateName+' not in store')
+    return None
+  last = lastDate(df)
+  queryStart = startDate if last is None else max(last-timedelta(days=overlap_days),startDate)
+  if queryStart>endDate:
+    return None
+  return (queryStart,endDate)
+
+# mergeSeries(df, newdf) : df extended with newdf, newdf wins on overlap
+def mergeSeries(df, newdf):
+  if df is None:
+    return newdf
+  if len(newdf)==0:
+    return df
+  df = pd.concat([df,newdf])
+  df = df[~df.index.duplicated(keep='last')].sort_index()
+  return df
+
+# loadSeries(queries, endDate, path, offline, max_busdays, url)
+#   queries : list of (rateCode, rateName, startDate)
+#   loads the store at path, fetches only the missing dates for all queries
+#   in parallel (see fedQueries()) and saves the store back if anything
+#   changed (path='' disables the store)
+#   returns list of dataframes, in the order of queries
+def loadSeries(queries, endDate, path=STORE_FILE, offline=False, max_busdays=STALE_BUSDAYS, url=FEDMKT_URL):
+  store = loadStore(path) if len(path)>0 else {}
+  fetch = []
+  for (rateCode,rateName,startDate) in queries:
+    queryRange = refreshRange(store.get(rateName),rateName,startDate,endDate,offline)
+    if queryRange is not None:
+      fetch.append((rateCode,rateName)+queryRange)
+  fetched = fedQueries(fetch,url) if fetch else []
+  changed = False
+  for ((rateCode,rateName,queryStart,queryEnd),newdf) in zip(fetch,fetched):
+    df = store.get(rateName)
+    merged = mergeSeries(df,newdf)
+    if df is None or not merged.equals(df):
+      store[rateName] = merged
+      changed = True
+  results = []
+  for (rateCode,rateName,startDate) in queries:
+    df = store[rateName]
+    if isStale(df,endDate,max_busdays):
+      print('WARNING: ',rateName,' last effectiveDate ',lastDate(df),
+            ' is stale as of ',endDate)
+    results.append(df)
+  if changed and len(path)>0:
+    saveStore(path,store)
+  return results
+
+# combineSeries(sofrdf, indexdf)
+#   combines the SOFR ON and SOFR Index series into a single dataframe
+#   (alldf) with the days each rate applies for and its dailyAccrual factor
+def combineSeries(sofrdf, indexdf, day_count=DAY_COUNT):
+  alldf = pd.concat([sofrdf,indexdf],axis='columns',\
+                    join='outer',ignore_index=False)
+  # add busday intervals between dates to series
+  dates=alldf.index
+  datelen=len(dates)
+  days=(dates[1:datelen]-dates[0:datelen-1]).days
+  days=days.append(pd.Index([math.nan])) # top off last day with null
+  alldf['days']=days # add days to df
+  # calculate dailyAccrual 
+  alldf[DAILY_ACCRUAL]=(alldf[SOFR_ON]*alldf['days'])/(day_count*100)+1.0
+  return alldf
@@ -0,0 +1,161 @@
+#
+'''
+Incremental daily update of accruals and error statistics
+
+When the Fed publishes new days, the only new accrual periods are the ones
+ending on the new dates. The state saved after a full run (processed test
+dates, running products and SOFR index at those dates and the STEP 3 error
+counts) lets update() price just those pairs, append them to the results
+file and add them to the counts. verify() recomputes everything to check
+for drift.
+'''
+
+#
+import os
+import numpy as np
+import pandas as pd
+import resultstore
+from errstats import ErrorStats
+
+STATE_FILE='sofrstate.npz'
+# tolerance of verify() on stored rates (rates are ~1e-2, float noise ~1e-14)
+VERIFY_RTOL=1e-9
+VERIFY_ATOL=1e-12
+
+# AccrualState
+#   testdates     : test dates already processed (datetime64[D] array)
+#   prefix        : running product of dailyAccrual up to each testdate
+#   index         : SOFR index on each testdate
+#   stats         : ErrorStats of every pair of testdates
+#   results_file  : results file holding those pairs
+#   results_count : number of records written to results_file
+class AccrualState:
+  def __init__(self, testdates, prefix, index, stats, results_file, results_count):
+    self.testdates=np.asarray(pd.DatetimeIndex(testdates).values.astype('datetime64[D]'))
+    self.prefix=np.asarray(prefix,dtype=np.float64)
+    self.index=np.asarray(index,dtype=np.float64)
+    self.stats=stats
+    self.results_file=results_file
+    self.results_count=int(results_count)
+
+  def lastDate(self):
+    return pd.Timestamp(self.testdates[-1]) if len(self.testdates)>0 else None
+
+# engineState(engine, stats, results_file, results_count)
+#   state after all pairs of engine.testdates have been processed
+def engineState(engine, stats, results_file, results_count):
+  return AccrualState(engine.testdates,engine.prefix[engine.pos],engine.index[engine.pos],
+                      stats,results_file,results_count)
+
+# loadState(path) : AccrualState saved by saveState(), numpy .npz layout
+def loadState(path=STATE_FILE):
+  with np.load(path) as npz:
+    stats=ErrorStats(npz['precisions'].tolist())
+    stats.samples=npz['samples']
+    stats.errors=npz['errors']
+    # states saved before the index was kept never match, forcing a recompute
+    index=npz['index'] if 'index' in npz.files else np.full(len(npz['prefix']),np.nan)
+    return AccrualState(npz['testdates'],npz['prefix'],index,stats,
+                        str(npz['results_file']),int(npz['results_count']))
+
+# saveState(path, state) : writes state to path, replacing the file atomically
+def saveState(path, state):
+  tmp_path=path+'.tmp'
+  with open(tmp_path,'wb') as f:
+    np.savez(f,testdates=state.testdates,prefix=state.prefix,index=state.index,
+             precisions=np.asarray(state.stats.precisions,dtype=np.int64),
+             samples=state.stats.samples,errors=state.stats.errors,
+             results_file=np.asarray(state.results_file),
+             results_count=np.asarray(state.results_count,dtype=np.int64))
+  os.replace(tmp_path,path)
+
+# checkPrefix(state, engine)
+#   raises ValueError unless engine starts with the state's test dates and
+#   reproduces its running products and SOFR index (a Fed revision of
+#   either series or a changed TEST0 needs a full recompute)
+def checkPrefix(state, engine):
+  n=len(state.testdates)
+  dates=engine.testdates.values.astype('datetime64[D]')
+  if len(dates)<n or not np.array_equal(dates[:n],state.testdates):
+    raise ValueError('test dates differ from the saved state, run a full recompute')
+  if not np.array_equal(engine.prefix[engine.pos[:n]],state.prefix):
+    raise ValueError('running products differ from the saved state, run a full recompute')
+  if not np.array_equal(engine.index[engine.pos[:n]],state.index,equal_nan=True):
+    raise ValueError('SOFR index differs from the saved state, run a full recompute')
+
+# update(state, engine)
+#   engine : AccrualEngine over the state's test dates plus any new ones
+#   prices the pairs ending on the new test dates, appends them to the
+#   results file, adds them to the error counts
+#   returns (new state, number of new pairs)
+def update(state, engine, block_pairs=resultstore.BLOCK_PAIRS):
+  checkPrefix(state,engine)
+  n0=len(state.testdates)
+  n=len(engine)
+  stats=state.stats
+  count=0
+  with resultstore.ResultsWriter(state.results_file,append=True,count=state.results_count) as writer:
+    col0=n0
+    while col0<n:
+      # whole columns of about block_pairs pairs
+      col1=col0+1
+      while col1<n and (col1+1-col0)*col1<=block_pairs:
+        col1+=1
+      i,j=engine.columnPairs(col0,col1)
+      rates=engine.rates(i,j)
+      writer.write(resultstore.resultRecords(engine.testdates,i,j,rates))
+      stats.add(*rates)
+      count+=len(i)
+      col0=col1
+  return engineState(engine,stats,state.results_file,state.results_count+count),count
+
+# verify(state, engine)
+#   full recompute check of the state against engine (built over the
+#   state's test dates): running products, every record of the results
+#   file, and the error counts of those records
+#   records are compared within VERIFY_RTOL/VERIFY_ATOL, so a state written
+#   by the reference loop (prefix products differ from its per-pair products
+#   by ~1e-14) verifies against the vectorized engine
+#   returns list of problems found, empty if the state has not drifted
+def verify(state, engine, block_pairs=resultstore.BLOCK_PAIRS):
+  problems=[]
+  try:
+    checkPrefix(state,engine)
+  except ValueError as e:
+    problems.append(str(e))
+  n=len(engine)
+  if n!=len(state.testdates):
+    problems.append('engine has '+str(n)+' test dates, state has '+\
+                    str(len(state.testdates)))
+    return problems
+  records=resultstore.readResults(state.results_file)
+  if len(records)!=state.results_count or len(records)!=engine.pairCount():
+    problems.append('results file has '+str(len(records))+' records, expected '+\
+                    str(engine.pairCount()))
+    return problems
+  testdays=engine.testdates.values.astype('datetime64[D]')
+  stats=ErrorStats(state.stats.precisions)
+  seen=np.zeros((engine.pairCount()+7)//8,dtype=np.uint8) # bitmap of pairs found
+  differ=0
+  for start in range(0,len(records),block_pairs):
+    block=records[start:start+block_pairs]
+    i=np.minimum(np.searchsorted(testdays,block['d0']),max(n-1,0))
+    j=np.minimum(np.searchsorted(testdays,block['d1']),max(n-1,0))
+    valid=(testdays[i]==block['d0'])&(testdays[j]==block['d1'])&(i<j)
+    iv=i[valid]
+    k=iv*(2*n-iv-1)//2+(j[valid]-iv-1) # position in the row-major triangle
+    np.bitwise_or.at(seen,k>>3,(1<<(k&7)).astype(np.uint8))
+    daysaccr,compounded,indexed=engine.rates(i,j)
+    same=valid&(block['daysaccr']==daysaccr)& \
+         np.isclose(block['compounded'],compounded,rtol=VERIFY_RTOL,atol=VERIFY_ATOL,equal_nan=True)& \
+         np.isclose(block['indexed'],indexed,rtol=VERIFY_RTOL,atol=VERIFY_ATOL,equal_nan=True)
+    differ+=int((~same).sum())
+    stats.add(block['daysaccr'],block['compounded'],block['indexed'])
+  if differ>0:
+    problems.append(str(differ)+' results records differ from a full recompute')
+  elif int(np.unpackbits(seen).sum())!=engine.pairCount():
+    problems.append('results file has duplicate or missing pairs')
+  if not (np.array_equal(stats.samples,state.stats.samples) and \
+          np.array_equal(stats.errors,state.stats.errors)):
+    problems.append('error counts differ from the results file')
+  return problems
@@ -0,0 +1,125 @@
+#
+'''
+Multi-core computation of the accrual triangle
+
+The (i, j>i) pairs are split into shards of contiguous rows holding about
+the same number of pairs (early rows are much longer than late ones), and
+the shards run on a process pool. The engine arrays are placed in shared
+memory once, so workers attach to them instead of receiving pickled copies.
+Shard results come back in shard order, identical to a single process run,
+with a bounded number of shards in flight so memory stays flat.
+'''
+
+#
+import multiprocessing as mp
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from accrual import trianglePairs, pairRates
+
+SHARDS_PER_WORKER=4 # more shards than workers evens out the load
+SHARDS_IN_FLIGHT=2 # per worker, submitted but not yet consumed
+
+# shardRows(n, nshards)
+#   splits the triangle of n testdates into at most nshards (row0, row1)
+#   row ranges with about n*(n-1)/2/nshards pairs each
+def shardRows(n, nshards):
+  counts=np.maximum(n-1-np.arange(n,dtype=np.int64),0)
+  cumulative=np.cumsum(counts)
+  total=cumulative[-1] if n>0 else 0
+  if total==0:
+    return []
+  targets=total*np.arange(1,nshards,dtype=np.float64)/nshards
+  bounds=np.searchsorted(cumulative,targets,side='left')+1
+  bounds=np.unique(np.concatenate(([0],bounds,[n])))
+  return [(int(r0),int(r1)) for (r0,r1) in zip(bounds[:-1],bounds[1:])
+          if cumulative[r1-1]-(cumulative[r0-1] if r0>0 else 0)>0]
+
+# SharedArrays(arrays)
+#   copies a dict of numpy arrays into shared memory blocks
+#   spec() is what a worker needs to attach() to them, close() when done
+class SharedArrays:
+  def __init__(self, arrays):
+    self.blocks={}
+    self.arrays={}
+    for name,values in arrays.items():
+      values=np.ascontiguousarray(values)
+      block=shared_memory.SharedMemory(create=True,size=max(values.nbytes,1))
+      shared=np.ndarray(values.shape,dtype=values.dtype,buffer=block.buf)
+      shared[...]=values
+      self.blocks[name]=block
+      self.arrays[name]=shared
+
+  def spec(self):
+    return {name:(self.blocks[name].name,values.shape,values.dtype.str)
+            for name,values in self.arrays.items()}
+
+  def close(self):
+    self.arrays={}
+    for block in self.blocks.values():
+      block.close()
+      block.unlink()
+    self.blocks={}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+# worker process state, set by _attach()
+_worker={}
+
+def _attach(spec, n, day_count):
+  blocks={}
+  arrays={}
+  for name,(block_name,shape,dtype) in spec.items():
+    blocks[name]=shared_memory.SharedMemory(name=block_name)
+    arrays[name]=np.ndarray(shape,dtype=np.dtype(dtype),buffer=blocks[name].buf)
+  _worker.update(blocks=blocks,arrays=arrays,n=n,day_count=day_count)
+
+def _shardRates(shard):
+  i,j=trianglePairs(_worker['n'],*shard)
+  return pairRates(_worker['arrays'],i,j,_worker['day_count'])
+
+# shardResults(engine, workers, nshards, block_pairs)
+#   yields (i, j, (daysaccr, compounded, indexed)) for every shard, in
+#   shard (i.e. row-major pair) order
+#   workers<=1 computes every shard in this process
+#   block_pairs : if given, use enough shards to keep each one about that
+#                 size (whole rows), so callers can stream them in blocks
+def shardResults(engine, workers=1, nshards=None, block_pairs=None):
+  n=len(engine)
+  if nshards is None:
+    nshards=max(workers,1)*SHARDS_PER_WORKER
+  if block_pairs is not None:
+    nshards=max(nshards,-(-engine.pairCount()//block_pairs))
+  shards=shardRows(n,nshards)
+  if workers<=1:
+    for shard in shards:
+      i,j=trianglePairs(n,*shard)
+      yield i,j,engine.rates(i,j)
+    return
+  with SharedArrays(engine.engineArrays()) as shared:
+    with mp.Pool(workers,initializer=_attach,
+                 initargs=(shared.spec(),n,engine.day_count)) as pool:
+      # at most SHARDS_IN_FLIGHT*workers shards are computed ahead of the
+      # consumer, so results never pile up faster than they are written
+      pending=deque()
+      for shard in shards:
+        if len(pending)>=SHARDS_IN_FLIGHT*workers:
+          done,result=pending.popleft()
+          yield trianglePairs(n,*done)+(result.get(),)
+        pending.append((shard,pool.apply_async(_shardRates,(shard,))))
+      while pending:
+        done,result=pending.popleft()
+        yield trianglePairs(n,*done)+(result.get(),)
+
+# parallelTriangle(engine, workers)
+#   same dataframe as engine.triangle(), computed on a pool of workers
+def parallelTriangle(engine, workers=1):
+  frames=[engine.frame(i,j,rates) for (i,j,rates) in shardResults(engine,workers)]
+  if not frames:
+    return engine.frame(*engine.trianglePairs())
+  return pd.concat(frames,ignore_index=True)
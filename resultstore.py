@@ -0,0 +1,139 @@
+#
+'''
+Typed on-disk store for accrual results
+
+Results are appended block by block as fixed-size binary records, so the
+full results table never has to be held in memory. A results file can be
+memory-mapped again without recomputing, or exported to CSV in blocks.
+
+usage: python resultstore.py allresults.bin allresults.csv
+'''
+
+#
+import os
+import sys
+import numpy as np
+import pandas as pd
+from sofrconst import RESULT_COLUMNS
+
+RESULTS_FILE='allresults.bin'
+BLOCK_PAIRS=1000000 # pairs per block written/read at once
+RESULTS_MAGIC=b'SOFRRES1'
+HEADER_SIZE=32 # magic, zero padded
+RESULT_DTYPE=np.dtype([('d0','<M8[D]'),
+                       ('d1','<M8[D]'),
+                       ('daysaccr','<i4'),
+                       ('compounded','<f8'),
+                       ('indexed','<f8')])
+
+# resultRecords(testdates, i, j, rates)
+#   testdates : dates indexed by the positions i, j
+#   rates     : (daysaccr, compounded, indexed) as returned by pairRates()
+#   returns a RESULT_DTYPE array, one record per (i, j) pair
+def resultRecords(testdates, i, j, rates):
+  daysaccr,compounded,indexed=rates
+  dates=pd.DatetimeIndex(testdates).values.astype('datetime64[D]')
+  records=np.empty(len(i),dtype=RESULT_DTYPE)
+  records['d0']=dates[i]
+  records['d1']=dates[j]
+  records['daysaccr']=daysaccr
+  records['compounded']=compounded
+  records['indexed']=indexed
+  return records
+
+# frameRecords(df) : RESULT_DTYPE array from a results dataframe
+def frameRecords(df):
+  records=np.empty(len(df),dtype=RESULT_DTYPE)
+  for name in RESULT_COLUMNS:
+    values=df[name].to_numpy()
+    if name in ('d0','d1'):
+      values=pd.DatetimeIndex(values).values.astype('datetime64[D]')
+    records[name]=values
+  return records
+
+# recordsFrame(records) : results dataframe (same layout as the reference loop)
+def recordsFrame(records):
+  return pd.DataFrame({'d0':pd.DatetimeIndex(records['d0'].astype('datetime64[ns]')),
+                       'd1':pd.DatetimeIndex(records['d1'].astype('datetime64[ns]')),
+                       'daysaccr':records['daysaccr'].astype(np.int64),
+                       'compounded':records['compounded'],
+                       'indexed':records['indexed']},columns=RESULT_COLUMNS)
+
+def checkHeader(f, path):
+  if f.read(HEADER_SIZE)[:len(RESULTS_MAGIC)]!=RESULTS_MAGIC:
+    raise ValueError(path+' is not a results file')
+
+# ResultsWriter(path, append, count)
+#   writes RESULT_DTYPE blocks to path as they are produced
+#   append=False starts a new file, append=True adds to an existing one
+#   count : with append, records known to be in the file (e.g. saved in a
+#           state), anything after them is a leftover of an interrupted
+#           write and is truncated before appending, a missing file
+#           raises FileNotFoundError rather than starting an empty one
+class ResultsWriter:
+  def __init__(self, path=RESULTS_FILE, append=False, count=None):
+    self.path=path
+    self.count=0
+    if append and count is not None and not os.path.exists(path):
+      raise FileNotFoundError(path+' is missing, expected '+str(count)+' records')
+    if append and os.path.exists(path):
+      self.file=open(path,'r+b')
+      checkHeader(self.file,path)
+      if count is not None:
+        size=HEADER_SIZE+count*RESULT_DTYPE.itemsize
+        if os.path.getsize(path)<size:
+          self.file.close()
+          raise ValueError(path+' has fewer than '+str(count)+' records')
+        self.file.truncate(size)
+      self.file.seek(0,os.SEEK_END)
+    else:
+      self.file=open(path,'wb')
+      self.file.write(RESULTS_MAGIC.ljust(HEADER_SIZE,b'\0'))
+
+  def write(self, records):
+    np.ascontiguousarray(records,dtype=RESULT_DTYPE).tofile(self.file)
+    self.count+=len(records)
+
+  def close(self):
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+# readResults(path)
+#   read-only memory map of the RESULT_DTYPE records in path
+def readResults(path=RESULTS_FILE):
+  with open(path,'rb') as f:
+    checkHeader(f,path)
+  if os.path.getsize(path)<=HEADER_SIZE:
+    return np.empty(0,dtype=RESULT_DTYPE)
+  return np.memmap(path,dtype=RESULT_DTYPE,mode='r',offset=HEADER_SIZE)
+
+# iterResults(path, block_pairs) : yields readResults(path) in blocks
+def iterResults(path=RESULTS_FILE, block_pairs=BLOCK_PAIRS):
+  records=readResults(path)
+  for start in range(0,len(records),block_pairs):
+    yield records[start:start+block_pairs]
+
+# exportCsv(path, csv_path, block_pairs)
+#   writes the results in path to csv_path block by block, same layout as
+#   resultsdf.to_csv() of the reference loop
+def exportCsv(path=RESULTS_FILE, csv_path='allresults.csv', block_pairs=BLOCK_PAIRS):
+  start=0
+  with open(csv_path,'w',newline='') as f:
+    for records in iterResults(path,block_pairs):
+      df=recordsFrame(records)
+      df.index=pd.RangeIndex(start,start+len(df))
+      df.to_csv(path_or_buf=f,header=(start==0))
+      start+=len(df)
+    if start==0:
+      recordsFrame(np.empty(0,dtype=RESULT_DTYPE)).to_csv(path_or_buf=f)
+  return start
+
+if __name__=='__main__':
+  if len(sys.argv)!=3:
+    sys.exit('usage: python resultstore.py <results file> <csv file>')
+  print('Exported ',exportCsv(sys.argv[1],sys.argv[2]),' results to ',sys.argv[2])
@@ -0,0 +1,22 @@
+#
+'''
+Constants shared by main.py and the SOFR helper modules
+'''
+
+#
+from datetime import datetime as dt
+
+START_DATE_SOFR_ON=dt(2018, 4, 2).date()
+START_DATE_SOFR_INDEX=dt(2020, 3, 2).date()
+DAY_COUNT=360
+# Fed data gleaned from XML links
+# https://www.newyorkfed.org/markets/reference-rates/sofr
+FEDMKT_URL='https://markets.newyorkfed.org/read'
+SOFR_ON_REQCODE='520' 
+SOFR_ON='percentRate'
+SOFR_INDEX_REQCODE='525'
+SOFR_INDEX='index'
+DAILY_ACCRUAL='dailyAccrual'
+FOLLOWING=1
+PRECEDING=-1
+RESULT_COLUMNS=['d0','d1','daysaccr','compounded','indexed']
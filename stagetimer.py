@@ -0,0 +1,111 @@
+#
+'''
+Per-stage instrumentation of the pipeline
+
+StageTimer accumulates wall time, peak traced memory (tracemalloc) and item
+counts for named stages (fetch, merge, accrual, write, summary, ...). It is
+used by bench.py and, with --timings, by production runs of main.py (wall
+time only); when disabled a stage costs one function call.
+'''
+
+#
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# StageRecord : totals of one named stage
+class StageRecord:
+  def __init__(self, name, memory=False):
+    self.name=name
+    self.calls=0
+    self.wall=0.0
+    self.peak=0 if memory else None # None: not traced
+    self.items=0
+
+  def asDict(self):
+    return {'stage':self.name,
+            'calls':self.calls,
+            'wall_s':self.wall,
+            'peak_bytes':self.peak,
+            'items':self.items,
+            'items_per_s':self.items/self.wall if self.wall>0 else None}
+
+# StageTimer(enabled, memory)
+#   enabled : record anything at all
+#   memory  : trace peak memory of each stage (tracemalloc), stages must
+#             not be nested; tracing slows python level work several times,
+#             so wall times of a traced run are not comparable, time and
+#             trace in separate runs
+#   usage:  with timer.stage('write',len(records)): writer.write(records)
+class StageTimer:
+  def __init__(self, enabled=True, memory=False):
+    self.enabled=enabled
+    self.memory=memory
+    self.records={}
+
+  def record(self, name):
+    if name not in self.records:
+      self.records[name]=StageRecord(name,self.memory)
+    return self.records[name]
+
+  # start(name) : begins timing a stage, returns the token for stop()
+  def start(self, name):
+    record=self.record(name)
+    if self.memory:
+      # restart so the peak is measured from the start of this stage
+      tracemalloc.stop()
+      tracemalloc.start()
+    return record,time.perf_counter()
+
+  # stop(token, items) : ends the stage begun by start(), counts it as a call
+  def stop(self, token, items=0):
+    record,start=token
+    record.wall+=time.perf_counter()-start
+    record.calls+=1
+    record.items+=items
+    if self.memory:
+      record.peak=max(record.peak,tracemalloc.get_traced_memory()[1])
+      tracemalloc.stop()
+
+  # stage(name, items) : times the with block, yields its StageRecord
+  @contextmanager
+  def stage(self, name, items=0):
+    if not self.enabled:
+      yield None
+      return
+    token=self.start(name)
+    try:
+      yield token[0]
+    finally:
+      self.stop(token,items)
+
+  # iterate(name, iterable, items)
+  #   yields from iterable, timing each next() that returns an element as
+  #   one call of the stage (the final, exhausted next() is not counted)
+  #   items : function of an element giving the items it holds
+  def iterate(self, name, iterable, items=None):
+    iterator=iter(iterable)
+    while True:
+      token=self.start(name) if self.enabled else None
+      try:
+        element=next(iterator)
+      except StopIteration:
+        if token is not None and self.memory:
+          tracemalloc.stop()
+        return
+      if token is not None:
+        self.stop(token,items(element) if items else 0)
+      yield element
+
+  def results(self):
+    return [record.asDict() for record in self.records.values()]
+
+  def report(self):
+    lines=['{:<10} {:>6} {:>10} {:>12} {:>14} {:>14}'.format(\
+      'stage','calls','wall_s','peak_MB','items','items/s')]
+    for r in self.results():
+      lines.append('{:<10} {:>6} {:>10.3f} {:>12} {:>14} {:>14}'.format(\
+        r['stage'],r['calls'],r['wall_s'],
+        '{:.1f}'.format(r['peak_bytes']/1e6) if r['peak_bytes'] is not None else '-',r['items'],
+        '{:.0f}'.format(r['items_per_s']) if r['items_per_s'] else '-'))
+    return '\n'.join(lines)
@@ -0,0 +1,28 @@
+#
+# modules live at the repo root, next to main.py
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#
+import pytest
+import bench
+import feddata
+from sofrconst import SOFR_INDEX
+from accrual import AccrualEngine
+
+TESTLEN=40 # reference loop is slow, O(TESTLEN^2) pandas calls
+
+@pytest.fixture(scope='module')
+def alldf():
+  sofrdf,indexdf=bench.syntheticSeries(200)
+  return feddata.combineSeries(sofrdf,indexdf)
+
+@pytest.fixture(scope='module')
+def testdates(alldf):
+  return alldf[alldf[SOFR_INDEX].notna()].index[:TESTLEN]
+
+@pytest.fixture(scope='module')
+def engine(alldf, testdates):
+  return AccrualEngine(alldf,testdates)
@@ -0,0 +1,52 @@
+#
+'''
+bench.py baseline comparison: regression flagging and the exit code
+'''
+
+#
+import json
+import os
+import subprocess
+import sys
+import pytest
+import bench
+
+BENCH=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'bench.py')
+
+def result(stage, n, wall_s):
+  return {'stage':stage,'n':n,'wall_s':wall_s}
+
+def test_compare_baseline_flags_regressions(capsys):
+  baseline={'results':[result('fetch',100,1.0),result('accrual',100,2.0),
+                       result('write',100,0.0),result('fetch',500,1.0)]}
+  results=[result('fetch',100,1.05),  # within tolerance
+           result('accrual',100,2.5), # 25% slower
+           result('write',100,0.1),   # baseline of zero
+           result('summary',100,9.0)] # not in the baseline
+  assert bench.compareBaseline(results,baseline,tolerance=0.1)==[('accrual',100),('write',100)]
+  out=capsys.readouterr().out
+  assert out.count('REGRESSION')==2
+  assert 'summary' not in out
+  assert bench.compareBaseline(results,baseline,tolerance=0.3)==[('write',100)]
+
+def test_bench_size_rejects_no_repeats():
+  with pytest.raises(ValueError):
+    bench.benchSize(20,repeats=0)
+
+def runBench(tmp_path, *args):
+  return subprocess.run([sys.executable,BENCH,'--sizes','20','--out',str(tmp_path/'bench.json')]+list(args),
+                        cwd=str(tmp_path),capture_output=True,text=True)
+
+def test_exit_code(tmp_path):
+  assert runBench(tmp_path,'--repeats','0').returncode==2
+  assert runBench(tmp_path,'--repeats','1').returncode==0
+  with open(tmp_path/'bench.json') as f:
+    saved=json.load(f)
+  for (name,wall_s,code) in [('slow.json',1e3,0),('fast.json',1e-9,1)]:
+    for r in saved['results']:
+      r['wall_s']=wall_s
+    with open(tmp_path/name,'w') as f:
+      json.dump(saved,f)
+    completed=runBench(tmp_path,'--repeats','1','--baseline',str(tmp_path/name))
+    assert completed.returncode==code,completed.stderr
+    assert ('REGRESSION' in completed.stdout)==(code==1)
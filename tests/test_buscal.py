@@ -0,0 +1,70 @@
+#
+'''
+BusCalendar lookups on a small hand-made calendar: exact/following/preceding
+matches, NaT, dates outside the calendar and shifts past either end
+'''
+
+#
+import numpy as np
+import pandas as pd
+import pytest
+from sofrconst import FOLLOWING, PRECEDING
+from buscal import BusCalendar, NOT_FOUND
+
+# Thursday 2020-03-05 is a holiday
+DATES=pd.DatetimeIndex(['2020-03-02','2020-03-03','2020-03-04','2020-03-06','2020-03-09'])
+
+@pytest.fixture
+def cal():
+  return BusCalendar(DATES)
+
+def test_locate_inside(cal):
+  days=pd.DatetimeIndex(['2020-03-02','2020-03-05','2020-03-07','2020-03-09'])
+  assert cal.locate(days).tolist()==[0,NOT_FOUND,NOT_FOUND,4]
+  assert cal.locate(days,FOLLOWING).tolist()==[0,3,4,4]
+  assert cal.locate(days,PRECEDING).tolist()==[0,2,3,4]
+
+@pytest.mark.parametrize('match',[0,FOLLOWING,PRECEDING])
+def test_locate_nat(cal, match):
+  days=pd.DatetimeIndex([pd.NaT,'2020-03-04',pd.NaT])
+  assert cal.locate(days,match).tolist()==[NOT_FOUND,2,NOT_FOUND]
+  assert cal.locate(pd.NaT,match).tolist()==[NOT_FOUND]
+
+def test_locate_outside(cal):
+  days=pd.DatetimeIndex(['2020-02-28','2020-03-01','2020-03-10','2020-04-01'])
+  assert cal.locate(days).tolist()==[NOT_FOUND]*4
+  # following rolls forward onto the first bus. day, preceding back onto the last
+  assert cal.locate(days,FOLLOWING).tolist()==[0,0,NOT_FOUND,NOT_FOUND]
+  assert cal.locate(days,PRECEDING).tolist()==[NOT_FOUND,NOT_FOUND,4,4]
+
+def test_shift(cal):
+  days=pd.DatetimeIndex(['2020-03-02','2020-03-05','2020-03-09',pd.NaT])
+  expected=pd.DatetimeIndex(['2020-03-03','2020-03-09',pd.NaT,pd.NaT])
+  assert cal.shift(days,FOLLOWING,1).equals(expected)
+  expected=pd.DatetimeIndex([pd.NaT,'2020-03-03','2020-03-06',pd.NaT])
+  assert cal.shift(days,PRECEDING,-1).equals(expected)
+  assert cal.shift(days,0,0).equals(pd.DatetimeIndex(['2020-03-02',pd.NaT,'2020-03-09',pd.NaT]))
+
+def test_shift_past_either_end(cal):
+  days=pd.DatetimeIndex(['2020-03-02','2020-03-09'])
+  assert cal.shiftPos(days,0,4).tolist()==[4,NOT_FOUND]
+  assert cal.shiftPos(days,0,-4).tolist()==[NOT_FOUND,0]
+  assert cal.shiftPos(days,0,5).tolist()==[NOT_FOUND,NOT_FOUND]
+  assert cal.shiftPos(days,0,-5).tolist()==[NOT_FOUND,NOT_FOUND]
+  assert cal.shift(days,0,-5).isna().all()
+
+def test_date_shift(cal):
+  assert cal.dateShift(pd.Timestamp('2020-03-05'),FOLLOWING,1)==pd.Timestamp('2020-03-09')
+  assert cal.dateShift(pd.Timestamp('2020-03-05'),PRECEDING)==pd.Timestamp('2020-03-04')
+  assert cal.dateShift(np.datetime64('2020-03-01'),FOLLOWING)==pd.Timestamp('2020-03-02')
+  assert cal.dateShift(pd.Timestamp('2020-03-05')) is None
+  assert cal.dateShift(pd.NaT,PRECEDING) is None
+  assert cal.dateShift(pd.Timestamp('2020-03-01'),PRECEDING) is None
+  assert cal.dateShift(pd.Timestamp('2020-03-10'),FOLLOWING) is None
+  assert cal.dateShift(pd.Timestamp('2020-03-09'),0,1) is None
+  assert cal.dateShift(pd.Timestamp('2020-03-02'),0,-1) is None
+
+def test_position(cal):
+  assert cal.position(pd.Timestamp('2020-03-06'))==3
+  with pytest.raises(KeyError):
+    cal.position(pd.Timestamp('2020-03-05'))
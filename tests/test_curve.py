@@ -0,0 +1,95 @@
+#
+'''
+SOFRCurve.accrue() against a day-by-day compounding loop over the
+conventions, and against AccrualEngine.rates() without them
+'''
+
+#
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from sofrconst import SOFR_ON, SOFR_INDEX
+from curve import SOFRCurve
+
+# referenceAccrue(alldf, start, end, lookback, lockout, observation_shift, day_count)
+#   one period compounded day by day, following the conventions documented
+#   in SOFRCurve.accrue(), NaN where it cannot be priced
+def referenceAccrue(alldf, start, end, lookback, lockout, observation_shift, day_count):
+  dates=alldf.index
+  rates=alldf[SOFR_ON].values/100
+  index=alldf[SOFR_INDEX].values
+  ps=dates.searchsorted(start)
+  pe=dates.searchsorted(end)
+  if ps>=len(dates) or pe>=len(dates) or pe<=ps or ps-lookback<0:
+    return np.nan,np.nan
+  if observation_shift:
+    first,last,lag=ps-lookback,pe-lookback,0
+  else:
+    first,last,lag=ps,pe,lookback
+  locked=max(last-lockout,first) if lockout>1 else last
+  growth=1.0
+  for k in range(first,last):
+    rate=rates[min(k,locked)-lag]
+    growth*=1+rate*(dates[k+1]-dates[k]).days/day_count
+  days=(dates[last]-dates[first]).days
+  compounded=(growth-1)*day_count/days
+  indexed=(index[pe-lookback]/index[ps-lookback]-1)*day_count/days
+  return compounded,indexed
+
+@pytest.fixture(scope='module')
+def periods(alldf):
+  rng=np.random.default_rng(1)
+  # calendar days, so starts/ends also fall on weekends and holidays
+  days=pd.date_range(alldf.index[0],alldf.index[-1])
+  starts=days[rng.integers(0,len(days),300)]
+  ends=starts+pd.to_timedelta(rng.integers(1,60,300),unit='D')
+  return starts,ends
+
+@pytest.mark.parametrize('lookback,lockout,observation_shift,day_count',[
+  (0,0,False,360),
+  (2,0,False,360),
+  (2,0,True,360),
+  (5,3,False,360),
+  (5,3,True,360),
+  (0,4,False,365),
+  (3,2,True,365),
+  (2,40,False,360), # lockout longer than most periods
+  (2,40,True,365),
+])
+def test_accrue_matches_daily_loop(alldf, periods, lookback, lockout, observation_shift, day_count):
+  starts,ends=periods
+  compounded,indexed=SOFRCurve(alldf).accrue(starts,ends,lookback,lockout,observation_shift,day_count)
+  expected=np.array([referenceAccrue(alldf,s,e,lookback,lockout,observation_shift,day_count)
+                     for (s,e) in zip(starts,ends)])
+  assert np.isnan(compounded).any() and not np.isnan(compounded).all()
+  np.testing.assert_allclose(compounded,expected[:,0],rtol=0,atol=1e-12)
+  if lockout<=1:
+    np.testing.assert_allclose(indexed,expected[:,1],rtol=0,atol=1e-12)
+
+def test_accrue_per_row_conventions(alldf, periods):
+  starts,ends=periods
+  count=len(starts)
+  lookback=np.arange(count)%4
+  lockout=np.arange(count)%7
+  observation_shift=np.arange(count)%2==1
+  compounded,indexed=SOFRCurve(alldf).accrue(starts,ends,lookback,lockout,observation_shift)
+  expected=[referenceAccrue(alldf,starts[k],ends[k],lookback[k],lockout[k],observation_shift[k],360)[0]
+            for k in range(count)]
+  np.testing.assert_allclose(compounded,expected,rtol=0,atol=1e-12)
+
+def test_accrue_matches_engine(alldf, testdates, engine):
+  i,j=engine.trianglePairs()
+  daysaccr,compounded,indexed=engine.rates(i,j)
+  actual=SOFRCurve(alldf).accrue(testdates[i],testdates[j])
+  np.testing.assert_allclose(actual[0],compounded,rtol=0,atol=1e-12)
+  np.testing.assert_allclose(actual[1],indexed,rtol=0,atol=1e-12)
+
+def test_accrue_invalid_rows_no_warning(alldf):
+  starts=pd.DatetimeIndex([alldf.index[10],alldf.index[20],pd.NaT,alldf.index[-1]+pd.Timedelta(days=5)])
+  ends=pd.DatetimeIndex([alldf.index[30],alldf.index[5],alldf.index[30],alldf.index[-1]+pd.Timedelta(days=9)])
+  with warnings.catch_warnings():
+    warnings.simplefilter('error',RuntimeWarning)
+    compounded,indexed=SOFRCurve(alldf).accrue(starts,ends,lookback=2,lockout=3)
+  assert not np.isnan(compounded[0])
+  assert np.isnan(compounded[1:]).all() and np.isnan(indexed[1:]).all()
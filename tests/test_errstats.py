@@ -0,0 +1,37 @@
+#
+'''
+Equal-output check of the ErrorStats histograms against the original STEP 3
+loop of main.py
+'''
+
+#
+import numpy as np
+import pandas as pd
+from errstats import ErrorStats, termBuckets, PRECISIONS
+
+# original STEP 3 loop of main.py
+def referenceSummary(resultsdf, min_terms, max_terms):
+  summary = []
+  for precision in PRECISIONS:
+    for (min_term,max_term) in zip(min_terms,max_terms):
+      inbucket=(((resultsdf['daysaccr']>min_term) & (resultsdf['daysaccr']<max_term)) | \
+                (resultsdf['daysaccr']==max_term))
+      samples=len(resultsdf[inbucket])
+      if(samples>0):
+        errors=len(resultsdf[(round(resultsdf['compounded'],precision)!=\
+                              round(resultsdf['indexed'],precision)) & inbucket])
+        summary.append([precision, int(min_term), int(max_term), int(errors), int(samples)])
+  return pd.DataFrame(summary,columns=["prec","minterm","maxterm","errors","samples"])
+
+def test_errstats_matches_step3_loop(engine):
+  resultsdf=engine.triangle()
+  min_terms,max_terms=termBuckets([1,3,6],9999)
+  expected=referenceSummary(resultsdf,min_terms,max_terms)
+  whole=ErrorStats().add(resultsdf['daysaccr'],resultsdf['compounded'],resultsdf['indexed'])
+  assert whole.summary(min_terms,max_terms).equals(expected)
+  # partial aggregates, e.g. per shard, merge exactly
+  merged=ErrorStats()
+  for part in np.array_split(np.arange(len(resultsdf)),5):
+    rows=resultsdf.iloc[part]
+    merged.merge(ErrorStats().add(rows['daysaccr'],rows['compounded'],rows['indexed']))
+  assert merged.summary(min_terms,max_terms).equals(expected)
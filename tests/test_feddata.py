@@ -0,0 +1,87 @@
+#
+'''
+Fed acquisition against a local HTTP stand-in (bench.serveSeries):
+streaming parse of the 520/525 responses in tests/fixtures, chunked
+concurrent fetch, and the local store refresh
+'''
+
+#
+import os
+from datetime import date
+import numpy as np
+import pandas as pd
+import pytest
+import bench
+import feddata
+from sofrconst import SOFR_ON_REQCODE, SOFR_ON, SOFR_INDEX_REQCODE, SOFR_INDEX
+
+FIXTURES=os.path.join(os.path.dirname(os.path.abspath(__file__)),'fixtures')
+FIXTURE_START=date(2020,3,2)
+FIXTURE_END=date(2020,3,17)
+FIXTURE_DATES=pd.DatetimeIndex(['2020-03-02','2020-03-03','2020-03-04','2020-03-05',
+                                '2020-03-06','2020-03-09','2020-03-10','2020-03-11',
+                                '2020-03-12','2020-03-13','2020-03-16','2020-03-17'])
+FIXTURE_RATES=[1.59,1.64,1.23,1.12,1.10,1.09,1.11,1.15,1.20,1.10,0.26,0.54]
+FIXTURE_INDEX=[1.04085026,1.04089623,1.04094365,1.04097922,1.04101160,1.04110703,
+               1.04113855,1.04117065,1.04120391,1.04123862,1.04133407,1.04134159]
+
+def fixture(rateCode):
+  name='fed_{}_{:%Y%m%d}_{:%Y%m%d}.xml'.format(rateCode,FIXTURE_START,FIXTURE_END)
+  with open(os.path.join(FIXTURES,name),'rb') as f:
+    return f.read()
+
+@pytest.fixture
+def served():
+  servers=[]
+  def serve(series):
+    server,url=bench.serveSeries(series)
+    servers.append(server)
+    return url
+  yield serve
+  for server in servers:
+    server.shutdown()
+    server.server_close()
+
+def test_fedqueries_parses_fixture_responses(served):
+  url=served({SOFR_ON_REQCODE:fixture(SOFR_ON_REQCODE),
+              SOFR_INDEX_REQCODE:fixture(SOFR_INDEX_REQCODE)})
+  sofrdf,indexdf=feddata.fedQueries(
+    [(SOFR_ON_REQCODE,SOFR_ON,FIXTURE_START,FIXTURE_END),
+     (SOFR_INDEX_REQCODE,SOFR_INDEX,FIXTURE_START,FIXTURE_END)],url)
+  assert (sofrdf.index==FIXTURE_DATES).all() and (indexdf.index==FIXTURE_DATES).all()
+  assert sofrdf[SOFR_ON].tolist()==FIXTURE_RATES
+  assert indexdf[SOFR_INDEX].tolist()==FIXTURE_INDEX
+  # the index compounds the overnight rates (8 decimal rounding)
+  alldf=feddata.combineSeries(sofrdf,indexdf)
+  compounded=alldf[SOFR_INDEX].iloc[0]*np.cumprod(alldf['dailyAccrual'].iloc[:-1])
+  np.testing.assert_allclose(compounded.values,alldf[SOFR_INDEX].iloc[1:].values,atol=2e-8)
+
+def test_chunked_fetch_matches_series(served):
+  sofrdf,indexdf=bench.syntheticSeries(600)
+  url=served({SOFR_ON_REQCODE:sofrdf,SOFR_INDEX_REQCODE:indexdf})
+  fetched=feddata.fedQueries(
+    [(SOFR_ON_REQCODE,SOFR_ON,sofrdf.index[0].date(),sofrdf.index[-1].date()),
+     (SOFR_INDEX_REQCODE,SOFR_INDEX,indexdf.index[0].date(),indexdf.index[-1].date())],
+    url,chunk_days=45,max_workers=3)
+  for (expected,actual) in zip([sofrdf,indexdf],fetched):
+    assert (actual.index==expected.index).all()
+    assert np.array_equal(actual.values,expected.values)
+
+def test_store_refresh_revisions_and_offline(served, tmp_path):
+  sofrdf,indexdf=bench.syntheticSeries(300)
+  path=str(tmp_path/'store.npz')
+  queries=[(SOFR_ON_REQCODE,SOFR_ON,sofrdf.index[0].date()),
+           (SOFR_INDEX_REQCODE,SOFR_INDEX,indexdf.index[0].date())]
+  endDate=sofrdf.index[-1].date()
+  url=served({SOFR_ON_REQCODE:sofrdf.iloc[:-10],SOFR_INDEX_REQCODE:indexdf.iloc[:-10]})
+  feddata.loadSeries(queries,endDate,path,max_busdays=9999,url=url)
+  # new days published and the last stored fixing revised
+  revised=sofrdf.copy()
+  revised.iloc[-11,0]=9.99
+  url=served({SOFR_ON_REQCODE:revised,SOFR_INDEX_REQCODE:indexdf})
+  feddata.loadSeries(queries,endDate,path,max_busdays=9999,url=url)
+  store=feddata.loadStore(path)
+  assert store[SOFR_ON].equals(revised)
+  assert store[SOFR_INDEX].equals(indexdf)
+  offline=feddata.loadSeries(queries,endDate,path,offline=True,max_busdays=9999,url='http://127.0.0.1:9/')
+  assert offline[0].equals(revised)
@@ -0,0 +1,71 @@
+#
+'''
+Equal-output check of update()+verify() against a full run of the pipeline,
+and the checks that stop update() from extending a state it cannot trust
+'''
+
+#
+import os
+import numpy as np
+import pytest
+import incremental
+import resultstore
+from sofrconst import SOFR_INDEX
+from accrual import AccrualEngine
+from parallel import shardResults
+from errstats import ErrorStats
+
+def fullRun(engine, results_file):
+  stats=ErrorStats()
+  with resultstore.ResultsWriter(results_file) as writer:
+    for (i,j,rates) in shardResults(engine):
+      writer.write(resultstore.resultRecords(engine.testdates,i,j,rates))
+      stats.add(*rates)
+  return incremental.engineState(engine,stats,results_file,writer.count)
+
+def test_update_then_verify(alldf, testdates, tmp_path):
+  results_file=str(tmp_path/'results.bin')
+  state_file=str(tmp_path/'state.npz')
+  incremental.saveState(state_file,fullRun(AccrualEngine(alldf,testdates[:-5]),results_file))
+  # an interrupted update leaves extra records behind, the next one drops them
+  with resultstore.ResultsWriter(results_file,append=True) as writer:
+    writer.write(np.zeros(7,dtype=resultstore.RESULT_DTYPE))
+  engine=AccrualEngine(alldf,testdates)
+  state,count=incremental.update(incremental.loadState(state_file),engine)
+  incremental.saveState(state_file,state)
+  assert count==engine.pairCount()-(len(testdates)-5)*(len(testdates)-6)//2
+  state=incremental.loadState(state_file)
+  assert incremental.verify(state,engine)==[]
+  full=fullRun(engine,str(tmp_path/'full.bin'))
+  assert np.array_equal(state.stats.samples,full.stats.samples)
+  assert np.array_equal(state.stats.errors,full.stats.errors)
+  # float noise of the reference loop (~1e-14) is not drift, 1e-6 is
+  records=np.memmap(results_file,dtype=resultstore.RESULT_DTYPE,mode='r+',
+                    offset=resultstore.HEADER_SIZE)
+  records['compounded'][3]+=4e-14
+  records.flush()
+  assert incremental.verify(state,engine)==[]
+  records['compounded'][3]+=1e-6
+  records.flush()
+  del records
+  assert incremental.verify(state,engine)!=[]
+
+def test_update_missing_results_file(alldf, testdates, tmp_path):
+  results_file=str(tmp_path/'results.bin')
+  state=fullRun(AccrualEngine(alldf,testdates[:-5]),results_file)
+  os.remove(results_file)
+  with pytest.raises(FileNotFoundError):
+    incremental.update(state,AccrualEngine(alldf,testdates))
+  assert not os.path.exists(results_file)
+
+def test_update_rejects_index_revision(alldf, testdates, tmp_path):
+  results_file=str(tmp_path/'results.bin')
+  state_file=str(tmp_path/'state.npz')
+  incremental.saveState(state_file,fullRun(AccrualEngine(alldf,testdates[:-5]),results_file))
+  # a revised SOFR Index leaves the running products of dailyAccrual as they were
+  revised=alldf.copy()
+  revised.loc[testdates[5],SOFR_INDEX]*=1.001
+  engine=AccrualEngine(revised,testdates)
+  with pytest.raises(ValueError,match='SOFR index differs'):
+    incremental.update(incremental.loadState(state_file),engine)
+  assert any('SOFR index' in problem for problem in incremental.verify(incremental.loadState(state_file),engine))
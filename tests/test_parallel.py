@@ -0,0 +1,20 @@
+#
+'''
+Equal-output check of the multiprocessing shards against a single process
+'''
+
+#
+import numpy as np
+from parallel import parallelTriangle, shardResults
+
+def test_parallel_matches_single_process(engine):
+  expected=engine.triangle()
+  assert parallelTriangle(engine,2).equals(expected)
+  blocks=list(shardResults(engine,2,block_pairs=50))
+  assert len(blocks)>2
+  i=np.concatenate([block[0] for block in blocks])
+  j=np.concatenate([block[1] for block in blocks])
+  compounded=np.concatenate([block[2][1] for block in blocks])
+  assert (engine.testdates[i]==expected['d0']).all()
+  assert (engine.testdates[j]==expected['d1']).all()
+  assert np.array_equal(compounded,expected['compounded'].values)
@@ -0,0 +1,32 @@
+#
+'''
+Equal-output check of the optimized pipeline against the original code:
+AccrualEngine vs rateSOFRon()/rateSOFRindex()
+'''
+
+#
+import numpy as np
+import pandas as pd
+from sofrconst import RESULT_COLUMNS
+from buscal import BusCalendar
+from main import rateSOFRon, rateSOFRindex
+
+def referenceTriangle(alldf, testdates):
+  cal=BusCalendar(alldf.index)
+  results=[]
+  for i in range(len(testdates)):
+    d0=testdates[i]
+    for j in range(i+1,len(testdates)):
+      d1=testdates[j]
+      results.append([d0,d1,(d1-d0).days,rateSOFRon(alldf,d0,d1,cal),rateSOFRindex(alldf,d0,d1)])
+  return pd.DataFrame(results,columns=RESULT_COLUMNS)
+
+def test_engine_matches_reference(alldf, testdates, engine):
+  expected=referenceTriangle(alldf,testdates)
+  actual=engine.triangle()
+  assert len(actual)==len(expected)==engine.pairCount()
+  assert (actual['d0'].values==expected['d0'].values).all()
+  assert (actual['d1'].values==expected['d1'].values).all()
+  assert (actual['daysaccr'].values==expected['daysaccr'].values).all()
+  np.testing.assert_allclose(actual['compounded'],expected['compounded'],rtol=0,atol=1e-12)
+  np.testing.assert_allclose(actual['indexed'],expected['indexed'],rtol=0,atol=1e-12)
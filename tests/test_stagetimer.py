@@ -0,0 +1,60 @@
+#
+'''
+StageTimer call/item counting, the disabled path and memory tracing
+'''
+
+#
+import tracemalloc
+import pytest
+from stagetimer import StageTimer
+
+def test_stage_counts_calls_and_items():
+  timer=StageTimer()
+  for k in range(3):
+    with timer.stage('write',10) as record:
+      assert record.name=='write'
+  with timer.stage('summary'):
+    pass
+  results={r['stage']:r for r in timer.results()}
+  assert list(results)==['write','summary']
+  assert (results['write']['calls'],results['write']['items'])==(3,30)
+  assert (results['summary']['calls'],results['summary']['items'])==(1,0)
+  assert results['write']['wall_s']>0
+  assert results['write']['peak_bytes'] is None
+  assert results['summary']['items_per_s']==0
+
+def test_stage_counts_failed_block():
+  timer=StageTimer()
+  with pytest.raises(RuntimeError):
+    with timer.stage('fetch',5):
+      raise RuntimeError('HTTP 520')
+  assert timer.results()[0]['calls']==1
+
+def test_iterate_counts_elements():
+  timer=StageTimer()
+  blocks=[[1,2],[3],[4,5,6]]
+  assert list(timer.iterate('accrual',blocks,items=len))==blocks
+  result=timer.results()[0]
+  # the exhausted next() is not a call
+  assert (result['stage'],result['calls'],result['items'])==('accrual',3,6)
+  assert list(timer.iterate('accrual',iter([])))==[]
+  assert timer.results()[0]['calls']==3
+
+def test_disabled_records_nothing():
+  timer=StageTimer(enabled=False)
+  with timer.stage('write',10) as record:
+    assert record is None
+  assert list(timer.iterate('accrual',range(4),items=lambda x:1))==[0,1,2,3]
+  assert timer.results()==[]
+  assert timer.report().splitlines()[1:]==[]
+
+def test_memory_traces_each_stage():
+  timer=StageTimer(memory=True)
+  with timer.stage('merge'):
+    block=bytearray(4_000_000)
+  del block
+  assert list(timer.iterate('accrual',range(2)))==[0,1]
+  results={r['stage']:r for r in timer.results()}
+  assert results['merge']['peak_bytes']>=4_000_000
+  assert results['accrual']['calls']==2
+  assert not tracemalloc.is_tracing()